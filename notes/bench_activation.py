@@ -0,0 +1,58 @@
+"""
+Microbenchmark of sourcing `bin/mactivate` from bash.
+
+Installs the activation scripts into a temporary env (no Mojo SDK needed)
+and compares the precomputed, fork-free `mactivate` with the previous one,
+which ran `$(pwd)` and a `cd`/`dirname` subshell and then sourced the
+Python `activate`.
+
+Run with `python notes/bench_activation.py [ROUNDS]`.
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from menv.builder import MojoEnvBuilder
+
+LEGACY_MACTIVATE = """\
+ORIGINAL_DIR="$(pwd)"
+SCRIPT_DIR="$( cd "$( dirname "${BASH_SOURCE[0]}" )" && pwd )"
+source "${SCRIPT_DIR}/activate"
+PATH="__BIN_PATH__:$PATH"
+export PATH
+cd "$ORIGINAL_DIR"
+"""
+
+
+def run(script, rounds):
+    loop = (
+        "deactivate () { :; }; "
+        f'for ((i = 0; i < {rounds}; i++)); do source "{script}"; deactivate; done'
+    )
+    start = time.perf_counter()
+    subprocess.run(["bash", "--noprofile", "--norc", "-c", loop], check=True)
+    return time.perf_counter() - start
+
+
+def main(rounds=2000):
+    with tempfile.TemporaryDirectory() as tmp:
+        builder = MojoEnvBuilder()
+        context = builder.ensure_directories(os.path.join(tmp, "env"))
+        builder.setup_scripts(context)
+        binpath = context.py_venv_binpath
+
+        legacy = os.path.join(binpath, "mactivate.legacy")
+        with open(legacy, "w", encoding="utf-8") as f:
+            f.write(LEGACY_MACTIVATE.replace("__BIN_PATH__", context.bin_path))
+
+        baseline = run(os.devnull, rounds)
+        for name in ("mactivate", "mactivate.legacy"):
+            elapsed = run(os.path.join(binpath, name), rounds) - baseline
+            print(f"{name:18} {elapsed / rounds * 1e6:8.1f} us/activation")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
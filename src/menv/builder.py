@@ -10,10 +10,14 @@ from pathlib import Path
 import tomlkit
 from tomlkit.toml_file import TOMLFile
 
+from .inventory import SDKInventory, get_inventory
+from .profiling import PhaseProfiler
+
 MODULAR_NAME = ".modular"
 MODULAR_PKG_FOLDER = "pkg"
 MODULAR_PKG_NAME = "packages.modular.com_mojo"
 MODULAR_CONFIG_NAME = "modular.cfg"
+MODULAR_INVENTORY_NAME = "sdk-inventory.bin"
 
 
 MODULAR_DIR = Path.home() / MODULAR_NAME
@@ -43,11 +47,53 @@ def clear_directory(path):
             shutil.rmtree(fn)
 
 
+def _tmp_name(path):
+    head, tail = os.path.split(path)
+    return os.path.join(head, f".{tail}.menv-tmp{os.getpid()}")
+
+
+def copyfile_replace(src, dst):
+    """
+    Copy ``src`` to ``dst`` by replacing ``dst`` instead of rewriting it.
+
+    ``dst`` may share its inode with other envs (see ``menv dedupe``) or be a
+    symlink into the SDK, and neither must change when this env is updated.
+    """
+    tmp = _tmp_name(dst)
+    try:
+        shutil.copyfile(src, tmp)
+        os.replace(tmp, dst)
+    except BaseException:
+        if os.path.lexists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def write_replace(path, data: bytes):
+    """Write ``data`` to ``path`` by replacing it, like :func:`copyfile_replace`."""
+    tmp = _tmp_name(path)
+    try:
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.lexists(tmp):
+            os.remove(tmp)
+        raise
+
+
 def change_config(path: str, section: str, key: str, value: str):
+    update_config(path, {section: {key: value}})
+
+
+def update_config(path: str, changes: dict[str, dict[str, str]]):
+    """Apply ``{section: {key: value}}`` changes with a single parse and write."""
     config = configparser.ConfigParser()
     config.read(path)
 
-    config[section][key] = value
+    for section, values in changes.items():
+        for key, value in values.items():
+            config[section][key] = value
 
     with open(path, "w", encoding="utf-8") as f:
         config.write(f)
@@ -63,6 +109,9 @@ class MojoEnvBuilder:
         prompt=None,
         upgrade_deps=False,
         scm_ignore_files=True,
+        inventory=None,
+        profile=None,
+        profile_dir="menv-profile",
     ):
         self.system_site_packages = system_site_packages
         self.clear = clear
@@ -74,6 +123,8 @@ class MojoEnvBuilder:
         self.prompt = prompt
         self.upgrade_deps = upgrade_deps
         self.scm_ignore_files = scm_ignore_files
+        self.inventory = inventory
+        self.profiler = PhaseProfiler(profile, profile_dir)
 
     def create(self, env_dir):
         """
@@ -83,7 +134,9 @@ class MojoEnvBuilder:
 
         """
         env_dir = os.path.abspath(env_dir)
-        context = self.ensure_directories(env_dir)
+        phase = self.profiler.phase
+        with phase("ensure_directories"):
+            context = self.ensure_directories(env_dir)
         # for scm in self.scm_ignore_files:
         #     getattr(self, f"create_{scm}_ignore_file")(context)
         # See issue 24875. We need system_site_packages to be False
@@ -91,11 +144,13 @@ class MojoEnvBuilder:
         true_system_site_packages = self.system_site_packages
         self.system_site_packages = False
         self.create_configuration(context)
-        self.setup_mojo(context)
+        with phase("setup_mojo"):
+            self.setup_mojo(context)
         # if self.with_pip:
         #     self._setup_pip(context)
         if not self.upgrade:
-            self.setup_scripts(context)
+            with phase("install_scripts"):
+                self.setup_scripts(context)
             self.post_setup(context)
         if true_system_site_packages:
             # We had set it to False before, now
@@ -123,12 +178,25 @@ class MojoEnvBuilder:
         if os.path.exists(env_dir) and self.clear:
             clear_directory(env_dir)
 
+        context = self.make_context(env_dir)
+        create_if_needed(env_dir)
+        create_if_needed(context.bin_path)
+        create_if_needed(context.lib_path)
+
+        return context
+
+    def make_context(self, env_dir: str | Path):
+        """
+        Compute the paths of an environment without touching the filesystem.
+
+        Returns a context object which holds paths in the environment,
+        for use by subsequent logic.
+        """
         context = types.SimpleNamespace()
         context.env_dir = str(env_dir)
         context.env_name = os.path.split(env_dir)[1]
         prompt = self.prompt if self.prompt is not None else context.env_name
         context.prompt = "(%s) " % prompt
-        create_if_needed(env_dir)
 
         context.mojo_dir = str(MOJO_BIN_DIR)  # TODO: use findmojo
         context.mojo_exe = "mojo"
@@ -136,6 +204,7 @@ class MojoEnvBuilder:
         # venv paths
         venv_modular_dir = Path(env_dir) / MODULAR_NAME
         venv_modular_cfg = venv_modular_dir / MODULAR_CONFIG_NAME
+        venv_inventory = venv_modular_dir / MODULAR_INVENTORY_NAME
         venv_pkg_dir = venv_modular_dir / MODULAR_PKG_FOLDER / MODULAR_PKG_NAME
 
         bin_name = "bin"  # Mojo bin name
@@ -150,6 +219,8 @@ class MojoEnvBuilder:
         context.lib_path = str(venv_lib_dir)
         context.env_exe = str(venv_mojo_excutable)
         context.env_cfg = str(venv_modular_cfg)
+        context.modular_home = str(venv_modular_dir)
+        context.inventory_path = str(venv_inventory)
 
         # venv bin path, reference: /usr/lib/python3.10/venv/__init__.py
         if sys.platform == "win32":
@@ -159,9 +230,6 @@ class MojoEnvBuilder:
 
         context.py_venv_binpath = str(Path(env_dir) / py_venv_biname)
 
-        create_if_needed(venv_bin_dir)
-        create_if_needed(venv_lib_dir)
-
         return context
 
     def create_configuration(self, context):
@@ -245,7 +313,7 @@ class MojoEnvBuilder:
                     logger.warning("Unable to symlink %r to %r", src, dst)
                     force_copy = True
             if force_copy:
-                shutil.copyfile(src, dst)
+                copyfile_replace(src, dst)
 
     else:
 
@@ -270,20 +338,7 @@ class MojoEnvBuilder:
                     logger.warning("Unable to copy %r", src)
                 return
 
-            shutil.copyfile(src, dst)
-
-    def recursive_symlink_or_copy(self, src, dst, relative_symlinks_ok=False):
-        for item in os.listdir(src):
-            src_item = os.path.join(src, item)
-            dst_item = os.path.join(dst, item)
-            if os.path.isfile(src_item):
-                self.symlink_or_copy(src_item, dst_item, relative_symlinks_ok)
-                shutil.copymode(src_item, dst_item)
-            elif os.path.isdir(src_item):
-                os.makedirs(dst_item, exist_ok=True)
-                self.recursive_symlink_or_copy(src_item, dst_item, relative_symlinks_ok)
-            else:
-                logger.warning(f"Skipping {src_item}")
+            copyfile_replace(src, dst)
 
     def create_git_ignore_file(self, context):
         """
@@ -314,46 +369,90 @@ class MojoEnvBuilder:
         dirname = context.mojo_dir  # context.mojo_dir = str(MOJO_BIN_DIR)
 
         if os.name != "nt":
+            inventory = self.get_sdk_inventory()
+            if self.upgrade:
+                self.remove_stale_files(context, inventory)
+
             # copy lib and bin to venv
-            self.recursive_symlink_or_copy(MOJO_LIB_DIR, libpath)
-            self.recursive_symlink_or_copy(MOJO_BIN_DIR, binpath)
+            inventory.materialize(context.pkg_dir, copier, self._chmod_copied)
+            inventory.save(context.inventory_path)
 
             for bin_item in os.listdir(binpath):
                 if not os.path.islink(os.path.join(binpath, bin_item)):
                     # Set the executable's permissions
                     os.chmod(os.path.join(binpath, bin_item), 0o755)
 
-            # Create symbolic links for mojo executables
-            for suffix in "mojo":
-                path = os.path.join(binpath, suffix)
-                if not os.path.exists(path):
-                    # Make copies if symlinks are not wanted
-                    copier(context.env_exe, path, relative_symlinks_ok=True)
-                    if not os.path.islink(path):
-                        os.chmod(path, 0o755)
-
             # Copy config and change import_path settings etc.
             copier(MODULAR_CONFIG, context.env_cfg)
-            self.write_modular_cfg(context)
+            with self.profiler.phase("write_modular_cfg"):
+                self.write_modular_cfg(context)
 
         else:
             pass  # TODO
 
+    def get_sdk_inventory(self):
+        """
+        Return the SDK inventory, scanning ``bin`` and ``lib`` of the Mojo
+        package at most once per process unless one was passed in.
+        """
+        if self.inventory is None:
+            self.inventory = get_inventory(str(MOJO_PKG_DIR), ("bin", "lib"))
+        return self.inventory
+
+    def _chmod_copied(self, path, mode):
+        # Symlinks already carry the mode of the SDK file.
+        if not self.symlinks or not os.path.islink(path):
+            os.chmod(path, mode)
+
+    def remove_stale_files(self, context, inventory):
+        """
+        Remove the entries installed by a previous run that are no longer
+        part of the SDK.
+
+        Args:
+            context: The information for the environment creation request
+                being processed.
+            inventory (SDKInventory): The inventory of the current SDK.
+        """
+        if not os.path.exists(context.inventory_path):
+            return
+        try:
+            previous = SDKInventory.load(context.inventory_path)
+        except (ValueError, EOFError, OSError) as e:
+            logger.warning(
+                "Unable to load %r, not removing stale files: %s",
+                context.inventory_path,
+                e,
+            )
+            return
+        _, removed, _ = previous.diff(inventory)
+        # Children sort after their parents, remove them first.
+        for rel in reversed(removed):
+            path = os.path.join(context.pkg_dir, rel)
+            if os.path.islink(path) or os.path.isfile(path):
+                os.remove(path)
+            elif os.path.isdir(path):
+                shutil.rmtree(path)
+
+    def verify_mojo(self, context):
+        """
+        Check the environment's Mojo package against the SDK inventory.
+
+        Returns:
+            list: Relative paths that are missing or differ from the SDK.
+        """
+        return self.get_sdk_inventory().verify(context.pkg_dir)
+
     def write_modular_cfg(self, context):
         cfg_path = context.env_cfg  # context.env_cfg = str(venv_modular_cfg)
         libpath = context.lib_path  # str(venv_pkg_dir / "lib")
 
-        change_config(
+        update_config(
             cfg_path,
-            section="mojo",
-            key="import_path",
-            value=os.path.join(libpath, "mojo"),
-        )  # not working
-        change_config(
-            cfg_path,
-            section="installed",
-            key="packages_modular_com_mojo",
-            value=context.pkg_dir,
+            {
+                "mojo": {"import_path": os.path.join(libpath, "mojo")},  # not working
+                "installed": {"packages_modular_com_mojo": context.pkg_dir},
+            },
         )
         # venv_pkg_config = os.path.join(context.pkg_dir, MODULAR_CONFIG_NAME)
         # print(venv_pkg_config)
@@ -390,6 +489,9 @@ class MojoEnvBuilder:
         # Replace '__VENV_MOJO__' placeholder with context.env_exe
         text = text.replace("__VENV_MOJO__", context.env_exe)
 
+        # Replace '__VENV_MODULAR_HOME__' placeholder with context.modular_home
+        text = text.replace("__VENV_MODULAR_HOME__", context.modular_home)
+
         return text
 
     def setup_scripts(self, context):
@@ -467,8 +569,9 @@ class MojoEnvBuilder:
                             "unable to copy script %r, " "may be binary: %s", srcfile, e
                         )  # Log a warning if unable to copy script due to UnicodeError
                 if data is not None:
-                    with open(dstfile, "wb") as f:
-                        f.write(data)  # Write the data to the destination file
+                    write_replace(
+                        dstfile, data
+                    )  # Write the data to the destination file
                     shutil.copymode(
                         srcfile, dstfile
                     )  # Copy the permissions from the source file to the destination file
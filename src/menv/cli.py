@@ -3,7 +3,11 @@ from venv import EnvBuilder
 
 import click
 
-from .builder import MojoEnvBuilder
+from .builder import MOJO_PKG_DIR, MojoEnvBuilder
+from .dedupe import HARDLINK, LINK_MODES, dedupe
+from .inventory import get_inventory, load_or_scan
+from .profiling import PROFILERS
+from .shellenv import FORMATS, shell_env
 from .utils import CORE_VENV_DEPS
 
 if os.name == "nt":
@@ -11,8 +15,29 @@ if os.name == "nt":
 else:
     use_symlinks = True
 
+CONTEXT_SETTINGS = dict(help_option_names=["-h", "--help"])
 
-@click.command(context_settings=dict(help_option_names=["-h", "--help"]))
+
+class DefaultGroup(click.Group):
+    """
+    A group that falls back to the ``create`` command, so that
+    ``menv DIR`` keeps working next to subcommands like ``menv dedupe``.
+    """
+
+    default_command = "create"
+
+    def parse_args(self, ctx, args):
+        if args and args[0] not in self.commands and args[0] not in ("-h", "--help"):
+            args = [self.default_command, *args]
+        return super().parse_args(ctx, args)
+
+
+@click.group(cls=DefaultGroup, context_settings=CONTEXT_SETTINGS)
+def cli():
+    """Mojo venv. Run `menv DIR` to create an environment."""
+
+
+@cli.command("create", context_settings=CONTEXT_SETTINGS)
 @click.argument("dirs", nargs=-1)
 @click.option(
     "--system-site-packages",
@@ -79,7 +104,26 @@ else:
     help="Skips adding SCM ignore files to the environment "
     "directory (Git is supported by default).",
 )
-def cli(
+@click.option(
+    "--sdk-inventory",
+    type=click.Path(dir_okay=False),
+    help="Load the Mojo SDK inventory from this file instead of scanning "
+    "the SDK. It is (re)written if missing or made for another SDK version.",
+)
+@click.option(
+    "--profile",
+    type=click.Choice(PROFILERS),
+    help="Profile each phase of the environment creation.",
+)
+@click.option(
+    "--profile-dir",
+    type=click.Path(file_okay=False),
+    default="menv-profile",
+    show_default=True,
+    help="Where --profile writes its reports, one `<index>-<name>` "
+    "subdirectory per DIR.",
+)
+def create(
     dirs,
     system_site,
     symlinks,
@@ -90,7 +134,11 @@ def cli(
     prompt,
     upgrade_deps,
     scm_ignore_files,
+    sdk_inventory,
+    profile,
+    profile_dir,
 ):
+    """Create Mojo virtual environments in DIRS."""
     if upgrade and clear:
         raise ValueError("you cannot supply --upgrade and --clear together.")
 
@@ -100,7 +148,12 @@ def cli(
     # print(f"{dir = }, {system_site = }, {symlinks = }, {clear = }, {upgrade = }, {with_pip = }, {prompt = }, {upgrade_deps = }")
     # defaults: dir = '.asdf', system_site = False, symlinks = False,
     # clear = False, upgrade = False, with_pip = True, prompt = None, upgrade_deps = False
-    for d in dirs:
+    if dirs and sdk_inventory:
+        inventory = load_or_scan(sdk_inventory, str(MOJO_PKG_DIR), ("bin", "lib"))
+    elif dirs:
+        # Scan once, shared by every env below.
+        inventory = get_inventory(str(MOJO_PKG_DIR), ("bin", "lib"))
+    for i, d in enumerate(dirs):
         py_venv_builder = EnvBuilder(
             system_site_packages=system_site,
             clear=clear,
@@ -111,8 +164,6 @@ def cli(
             upgrade_deps=upgrade_deps,
         )
 
-        py_venv_builder.create(d)
-
         # print(f"{scm_ignore_files = }")
         # if isinstance(scm_ignore_files, str):
         #     scm_ignore_files = eval(scm_ignore_files)
@@ -124,5 +175,54 @@ def cli(
             prompt=prompt,
             upgrade_deps=upgrade_deps,
             scm_ignore_files=scm_ignore_files,
+            inventory=inventory,
+            profile=profile,
+            # DIRS may share a basename, e.g. a/env and b/env.
+            profile_dir=os.path.join(
+                profile_dir, f"{i}-{os.path.basename(os.path.abspath(d))}"
+            ),
         )
+
+        with mojo_venv_builder.profiler.phase("EnvBuilder"):
+            py_venv_builder.create(d)
         mojo_venv_builder.create(d)
+
+
+@cli.command("dedupe", context_settings=CONTEXT_SETTINGS)
+@click.argument("dirs", nargs=-1, required=True)
+@click.option(
+    "--link",
+    "link_mode",
+    type=click.Choice(LINK_MODES),
+    default=HARDLINK,
+    show_default=True,
+    help="Replace duplicates with hardlinks or with reflinks "
+    "(copy-on-write clones, needs filesystem support). Hardlinked files are "
+    "shared between envs: never edit them in place.",
+)
+@click.option("-j", "--jobs", type=int, default=None, help="Number of worker threads.")
+@click.option("--dry-run", is_flag=True, help="Only report what would be reclaimed.")
+def dedupe_cmd(dirs, link_mode, jobs, dry_run):
+    """Share identical Mojo package files across the environments in DIRS."""
+    result = dedupe(dirs, link_mode=link_mode, jobs=jobs, dry_run=dry_run)
+    verb = "Would reclaim" if dry_run else "Reclaimed"
+    click.echo(
+        f"Scanned {result.files_scanned} files, "
+        f"linked {result.files_linked} duplicates. "
+        f"{verb} {result.bytes_reclaimed} bytes."
+    )
+
+
+@cli.command("shell-env", context_settings=CONTEXT_SETTINGS)
+@click.argument("dir", type=click.Path(exists=True, file_okay=False))
+@click.option(
+    "--format",
+    "fmt",
+    type=click.Choice(FORMATS),
+    default="sh",
+    show_default=True,
+    help='Output format, e.g. `eval "$(menv shell-env DIR)"` in a .envrc.',
+)
+def shell_env_cmd(dir, fmt):
+    """Print the activation exports of the environment in DIR."""
+    click.echo(shell_env(dir, fmt), nl=False)
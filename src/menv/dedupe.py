@@ -0,0 +1,416 @@
+"""
+Convert duplicated files across environments into shared hardlinks/reflinks.
+
+Environments created with ``--copies`` each hold a private copy of the Mojo
+package.  :func:`dedupe` walks the Mojo package of a set of environments,
+finds identical regular files and replaces the duplicates with links to a
+single canonical copy.  The rest of an environment, like the Python venv
+that the stdlib ``venv`` rewrites in place on ``--upgrade``, is left alone.
+
+Candidates are narrowed in three passes (size, partial hash, full hash).  All
+bookkeeping lives in an on-disk SQLite index and every pass is streamed in
+fixed-size batches, so memory stays bounded regardless of the tree size.
+"""
+
+import collections
+import hashlib
+import itertools
+import logging
+import os
+import queue
+import sqlite3
+import stat
+import tempfile
+import threading
+import types
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from .builder import (
+    MODULAR_CONFIG_NAME,
+    MODULAR_NAME,
+    MODULAR_PKG_FOLDER,
+    MODULAR_PKG_NAME,
+)
+
+logger = logging.getLogger(__name__)
+
+HARDLINK = "hardlink"
+REFLINK = "reflink"
+LINK_MODES = (HARDLINK, REFLINK)
+
+# Files holding env-specific settings must never be shared between envs.
+SKIP_NAMES = frozenset((MODULAR_CONFIG_NAME, "mojovenv.toml", "pyvenv.cfg"))
+
+PARTIAL_HASH_SIZE = 64 * 1024
+CHUNK_SIZE = 1024 * 1024
+BATCH_SIZE = 1000
+
+FICLONE = 0x40049409  # _IOW(0x94, 9, int), see ioctl_ficlone(2)
+
+_TMP_PREFIX = ".menv-dedupe-"
+
+_SCHEMA = """
+CREATE TABLE files (
+    id INTEGER PRIMARY KEY,
+    path BLOB NOT NULL,
+    dev INTEGER NOT NULL,
+    ino INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mode INTEGER NOT NULL,
+    uid INTEGER NOT NULL,
+    gid INTEGER NOT NULL,
+    mtime INTEGER NOT NULL,
+    stage INTEGER NOT NULL DEFAULT 0,
+    partial BLOB,
+    full BLOB
+);
+"""
+
+# Files are only ever linked to files with the same key, so ownership and
+# modes stay untouched.
+_KEY = "dev, size, mode, uid, gid"
+
+# Values of the stage column: which hash a file still needs.
+_NEEDS_PARTIAL = 1
+_NEEDS_FULL = 2
+
+
+def _scan_tree(root, out, stop):
+    """
+    Walk ``root`` and put batches of index rows into the ``out`` queue, until
+    the ``stop`` event is set.
+
+    Paths are stored as bytes, so names that are not valid UTF-8 survive the
+    round trip through the index.
+    """
+    batch = []
+    stack = [root]
+    while stack:
+        if stop.is_set():
+            return
+        top = stack.pop()
+        try:
+            it = os.scandir(top)
+        except OSError as e:
+            logger.warning("Unable to scan %r: %s", top, e)
+            continue
+        with it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                        continue
+                    if not entry.is_file(follow_symlinks=False):
+                        continue  # symlinks, sockets, ...
+                    if entry.name in SKIP_NAMES or entry.name.startswith(_TMP_PREFIX):
+                        continue
+                    st = entry.stat(follow_symlinks=False)
+                except OSError as e:
+                    logger.warning("Unable to stat %r: %s", entry.path, e)
+                    continue
+                if st.st_size == 0:
+                    continue
+                batch.append(
+                    (
+                        os.fsencode(entry.path),
+                        st.st_dev,
+                        st.st_ino,
+                        st.st_size,
+                        st.st_mode,
+                        st.st_uid,
+                        st.st_gid,
+                        st.st_mtime_ns,
+                    )
+                )
+                if len(batch) >= BATCH_SIZE:
+                    out.put(batch)
+                    batch = []
+    if batch:
+        out.put(batch)
+
+
+def _hash_file(path, limit=None):
+    h = hashlib.blake2b(digest_size=20)
+    remaining = limit
+    with open(path, "rb") as f:
+        while True:
+            size = CHUNK_SIZE if remaining is None else min(CHUNK_SIZE, remaining)
+            if size == 0:
+                break
+            chunk = f.read(size)
+            if not chunk:
+                break
+            h.update(chunk)
+            if remaining is not None:
+                remaining -= len(chunk)
+    return h.digest()
+
+
+def _safe_hash(path, limit=None):
+    try:
+        return _hash_file(path, limit)
+    except OSError as e:
+        logger.warning("Unable to hash %r: %s", path, e)
+        return None
+
+
+class _Index:
+    """On-disk file index used to group duplicate candidates."""
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode = OFF")
+        self.conn.execute("PRAGMA synchronous = OFF")
+        self.conn.executescript(_SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def insert(self, rows):
+        self.conn.executemany(
+            "INSERT INTO files (path, dev, ino, size, mode, uid, gid, mtime) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+
+    def count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    def _batches(self, stage):
+        """Yield ``(id, path, size)`` batches of the files in ``stage``.
+
+        Keyset pagination over the stage index: no cursor is kept open
+        between batches, so the caller may update the table while iterating.
+        """
+        query = (
+            "SELECT id, path, size FROM files "
+            "WHERE stage = ? AND id > ? ORDER BY id LIMIT ?"
+        )
+        last = -1
+        while True:
+            rows = self.conn.execute(query, (stage, last, BATCH_SIZE)).fetchall()
+            if not rows:
+                return
+            yield rows
+            last = rows[-1][0]
+
+    def fill_partial(self, executor):
+        # Group by size once, not once per batch.
+        self.conn.execute(f"""
+            UPDATE files SET stage = {_NEEDS_PARTIAL}
+            WHERE ({_KEY}) IN (
+                SELECT {_KEY} FROM files
+                GROUP BY {_KEY} HAVING COUNT(DISTINCT ino) > 1
+            )
+            """)
+        self.conn.execute("CREATE INDEX files_stage ON files (stage)")
+        for rows in self._batches(_NEEDS_PARTIAL):
+            digests = executor.map(
+                lambda row: _safe_hash(row[1], PARTIAL_HASH_SIZE), rows
+            )
+            self.conn.executemany(
+                "UPDATE files SET partial = ?, full = ? WHERE id = ?",
+                [
+                    # Small files were read completely already.
+                    (d, d if row[2] <= PARTIAL_HASH_SIZE else None, row[0])
+                    for row, d in zip(rows, digests)
+                ],
+            )
+
+    def fill_full(self, executor):
+        self.conn.execute(f"""
+            UPDATE files SET stage = {_NEEDS_FULL}
+            WHERE full IS NULL AND ({_KEY}, partial) IN (
+                SELECT {_KEY}, partial FROM files
+                WHERE partial IS NOT NULL
+                GROUP BY {_KEY}, partial HAVING COUNT(DISTINCT ino) > 1
+            )
+            """)
+        for rows in self._batches(_NEEDS_FULL):
+            digests = executor.map(lambda row: _safe_hash(row[1]), rows)
+            self.conn.executemany(
+                "UPDATE files SET full = ? WHERE id = ?",
+                [(d, row[0]) for row, d in zip(rows, digests)],
+            )
+
+    def groups(self):
+        """Yield lists of identical files, one group at a time."""
+        cursor = self.conn.execute(f"""
+            SELECT {_KEY}, full, path, ino, mtime FROM files
+            WHERE full IS NOT NULL
+            ORDER BY {_KEY}, full, ino, path
+            """)
+        for _, group in itertools.groupby(cursor, key=lambda row: row[:6]):
+            group = list(group)
+            if len({row[7] for row in group}) > 1:
+                yield group
+
+
+def _reflink(src, dst):
+    import fcntl
+
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+
+
+def _replace_with_link(src, dst, st, link_mode):
+    """
+    Atomically replace ``dst``, whose ``lstat`` is ``st``, by a link to
+    ``src``.
+    """
+    tmp = os.path.join(os.path.dirname(dst), f"{_TMP_PREFIX}{uuid.uuid4().hex}")
+    try:
+        if link_mode == HARDLINK:
+            os.link(src, tmp)
+        else:
+            # A clone is a new file: give it the metadata of the one it
+            # replaces. chown first, it may clear setuid/setgid bits.
+            _reflink(src, tmp)
+            os.chown(tmp, st.st_uid, st.st_gid)
+            os.chmod(tmp, stat.S_IMODE(st.st_mode))
+            os.utime(tmp, ns=(st.st_atime_ns, st.st_mtime_ns))
+        os.replace(tmp, dst)
+    except BaseException:
+        if os.path.lexists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def _stat_if_unchanged(row):
+    """Return the ``lstat`` of an index row's file if it still matches."""
+    _, size, mode, uid, gid, _, path, ino, mtime = row
+    path = os.fsdecode(path)
+    try:
+        st = os.lstat(path)
+    except OSError as e:
+        logger.warning("Skipping %r: %s", path, e)
+        return None
+    if (
+        st.st_ino != ino
+        or st.st_size != size
+        or st.st_mode != mode
+        or st.st_uid != uid
+        or st.st_gid != gid
+        or st.st_mtime_ns != mtime
+    ):
+        logger.warning("Skipping %r: changed during dedupe", path)
+        return None
+    return st
+
+
+def _link_group(group, link_mode, dry_run, result):
+    canonical = group[0]
+    src = os.fsdecode(canonical[6])
+    # The canonical file is what every other file will point to: if it was
+    # rewritten since it was hashed, the whole group is off.
+    if _stat_if_unchanged(canonical) is None:
+        return
+    nlinks = {}  # inode -> link count when first seen
+    replaced = collections.Counter()  # inode -> links replaced so far
+    for row in group[1:]:
+        size, mode, ino = row[1], row[2], row[7]
+        if ino == canonical[7]:
+            continue  # already shares the canonical inode
+        st = _stat_if_unchanged(row)
+        if st is None:
+            continue
+        path = os.fsdecode(row[6])
+        nlinks.setdefault(ino, st.st_nlink)
+        if not dry_run:
+            try:
+                _replace_with_link(src, path, st, link_mode)
+            except OSError as e:
+                logger.warning("Unable to %s %r to %r: %s", link_mode, src, path, e)
+                continue
+        result.files_linked += 1
+        replaced[ino] += 1
+        # With reflinks the blocks are shared; with hardlinks the old inode is
+        # freed once all of its links are replaced. Counting the links here
+        # rather than re-reading st_nlink keeps --dry-run accurate.
+        if link_mode == REFLINK or replaced[ino] == nlinks[ino]:
+            result.bytes_reclaimed += size
+
+
+def dedupe(dirs, link_mode=HARDLINK, jobs=None, dry_run=False, index_dir=None):
+    """
+    Replace duplicate files across environment trees with links.
+
+    Args:
+        dirs: Environment directories. Only their Mojo package
+            (``.modular/pkg/packages.modular.com_mojo``) is scanned.
+        link_mode: Either ``"hardlink"`` or ``"reflink"``. Files are only
+            linked to files on the same device with the same owner, group
+            and permission bits, so none of them change. Hardlinked files
+            share one inode across envs and must never be rewritten in
+            place; the builder replaces files instead.
+        jobs: Number of worker threads for scanning and hashing.
+        dry_run: Only report what would be done.
+        index_dir: Directory for the temporary on-disk index.
+
+    Returns:
+        types.SimpleNamespace: ``files_scanned``, ``files_linked`` and
+        ``bytes_reclaimed``.
+    """
+    if link_mode not in LINK_MODES:
+        raise ValueError(f"Unknown link mode {link_mode!r}")
+    roots = []
+    for d in dirs:
+        root = os.path.join(
+            os.path.abspath(d), MODULAR_NAME, MODULAR_PKG_FOLDER, MODULAR_PKG_NAME
+        )
+        if os.path.isdir(root):
+            roots.append(root)
+        else:
+            logger.warning("Skipping %r: no Mojo package in it", d)
+    jobs = jobs or min(32, (os.cpu_count() or 1) + 4)
+
+    result = types.SimpleNamespace(files_scanned=0, files_linked=0, bytes_reclaimed=0)
+    with tempfile.TemporaryDirectory(prefix="menv-dedupe-", dir=index_dir) as tmp:
+        index = _Index(os.path.join(tmp, "index.sqlite3"))
+        try:
+            with ThreadPoolExecutor(max_workers=jobs) as executor:
+                # Bounded queue: scanners block instead of buffering the tree.
+                batches = queue.Queue(maxsize=jobs * 2)
+                done = object()
+                stop = threading.Event()
+
+                def scan(root):
+                    try:
+                        _scan_tree(root, batches, stop)
+                    finally:
+                        batches.put(done)
+
+                scans = [executor.submit(scan, root) for root in roots]
+
+                remaining = len(roots)
+                try:
+                    while remaining:
+                        batch = batches.get()
+                        if batch is done:
+                            remaining -= 1
+                        else:
+                            index.insert(batch)
+                except BaseException:
+                    # Unblock and stop the scanners, or leaving the executor
+                    # waits on them forever.
+                    stop.set()
+                    while remaining:
+                        if batches.get() is done:
+                            remaining -= 1
+                    raise
+                for future in scans:
+                    future.result()
+                index.conn.commit()
+                result.files_scanned = index.count()
+
+                index.fill_partial(executor)
+                index.fill_full(executor)
+                index.conn.commit()
+
+            for group in index.groups():
+                _link_group(group, link_mode, dry_run, result)
+        finally:
+            index.close()
+
+    return result
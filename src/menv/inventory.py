@@ -0,0 +1,293 @@
+"""
+Compact, reusable inventory of the Mojo SDK tree.
+
+:class:`SDKInventory` scans the SDK once and keeps the result in parallel
+``array`` columns: relative paths are stored as an index into an interned
+directory table plus an interned basename, and sizes, modes, mtimes and
+symlink targets are kept as plain machine values instead of per-file Python
+objects. An inventory can be saved to and loaded from disk, and is used by
+:class:`menv.builder.MojoEnvBuilder` to populate, upgrade and verify
+environments without rescanning the SDK for every target.
+"""
+
+import functools
+import json
+import logging
+import os
+import stat
+import sys
+from array import array
+
+logger = logging.getLogger(__name__)
+
+FILE = 0
+DIR = 1
+
+NO_LINK = -1
+
+_MAGIC = b"MENVINV1\n"
+
+# (attribute, typecode) of every numeric column, in on-disk order.
+_COLUMNS = (
+    ("dir_idx", "I"),
+    ("kind", "B"),
+    ("size", "q"),
+    ("mode", "I"),
+    ("mtime", "q"),
+    ("link", "i"),
+)
+
+
+class SDKInventory:
+    """
+    Inventory of the files and directories below an SDK root.
+
+    Entries are addressed by their position. Directories always come before
+    their contents, so the entries can be materialized in order.
+    """
+
+    def __init__(self, root, version=None, subdirs=None):
+        self.root = os.fspath(root)
+        self.version = version  # contents of the SDK's VERSION file
+        self.subdirs = None if subdirs is None else tuple(subdirs)  # None: all
+        self.dirs = []  # relative directory paths, "" is the root
+        self.names = []  # interned basenames
+        self.targets = []  # symlink targets referenced by the link column
+        for attr, typecode in _COLUMNS:
+            setattr(self, attr, array(typecode))
+
+    def __len__(self):
+        return len(self.names)
+
+    def relpath(self, i):
+        d = self.dirs[self.dir_idx[i]]
+        return d + os.sep + self.names[i] if d else self.names[i]
+
+    def relpaths(self):
+        for i in range(len(self)):
+            yield self.relpath(i)
+
+    def link_target(self, i):
+        link = self.link[i]
+        return None if link == NO_LINK else self.targets[link]
+
+    @classmethod
+    def scan(cls, root, subdirs=None):
+        """
+        Scan ``root`` (or only the given ``subdirs`` of it).
+
+        Symlinks are followed and recorded as the file or directory they
+        point to, so :meth:`materialize` copies their contents; their targets
+        are kept in the ``link`` column.
+        """
+        inv = cls(root, read_version(root), subdirs)
+        intern = sys.intern
+        dir_ids = {}
+
+        def add_dir(rel):
+            dir_ids[rel] = len(inv.dirs)
+            inv.dirs.append(intern(rel))
+
+        add_dir("")
+        if subdirs is None:
+            pending = [""]
+        else:
+            pending = []
+            for sub in subdirs:
+                inv._append(0, intern(sub), DIR, os.stat(os.path.join(root, sub)), None)
+                add_dir(sub)
+                pending.append(sub)
+
+        while pending:
+            rel = pending.pop()
+            parent = dir_ids[rel]
+            with os.scandir(os.path.join(inv.root, rel)) as it:
+                entries = sorted(it, key=lambda e: e.name)
+            for entry in entries:
+                target = os.readlink(entry.path) if entry.is_symlink() else None
+                if entry.is_file():
+                    kind = FILE
+                elif entry.is_dir():
+                    kind = DIR
+                else:
+                    logger.warning(f"Skipping {entry.path}")
+                    continue
+                inv._append(parent, intern(entry.name), kind, entry.stat(), target)
+                if kind == DIR:
+                    sub = os.path.join(rel, entry.name) if rel else entry.name
+                    add_dir(sub)
+                    pending.append(sub)
+        return inv
+
+    def _append(self, dir_idx, name, kind, st, target):
+        self.dir_idx.append(dir_idx)
+        self.names.append(name)
+        self.kind.append(kind)
+        self.size.append(st.st_size if kind == FILE else 0)
+        self.mode.append(st.st_mode & 0o7777)
+        self.mtime.append(st.st_mtime_ns)
+        if target is None:
+            self.link.append(NO_LINK)
+        else:
+            self.link.append(len(self.targets))
+            self.targets.append(target)
+
+    def save(self, path):
+        """Atomically write the inventory to ``path``."""
+        header = {
+            "root": self.root,
+            "version": self.version,
+            "subdirs": self.subdirs,
+            "dirs": self.dirs,
+            "names": self.names,
+            "targets": self.targets,
+            "byteorder": sys.byteorder,
+        }
+        tmp = f"{path}.tmp{os.getpid()}"
+        with open(tmp, "wb") as f:
+            f.write(_MAGIC)
+            f.write(json.dumps(header).encode("utf-8") + b"\n")
+            for attr, _ in _COLUMNS:
+                getattr(self, attr).tofile(f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load an inventory written by :meth:`save`.
+
+        Raises:
+            ValueError, EOFError, OSError: The file is unreadable, truncated
+            or not an SDK inventory.
+        """
+        with open(path, "rb") as f:
+            if f.readline() != _MAGIC:
+                raise ValueError(f"{path!r} is not an SDK inventory")
+            header = json.loads(f.readline())
+            inv = cls(header["root"], header.get("version"), header.get("subdirs"))
+            intern = sys.intern
+            inv.dirs = [intern(d) for d in header["dirs"]]
+            inv.names = [intern(n) for n in header["names"]]
+            inv.targets = header["targets"]
+            for attr, _ in _COLUMNS:
+                column = getattr(inv, attr)
+                column.fromfile(f, len(inv.names))
+                if header["byteorder"] != sys.byteorder:
+                    column.byteswap()
+        return inv
+
+    def materialize(self, dst, copier, chmod=None):
+        """
+        Recreate the inventory below ``dst``.
+
+        Directories are created and each file is passed to
+        ``copier(src, dst)``. If given, ``chmod(dst, mode)`` is then called
+        with the recorded mode, so the source never has to be stat'ed again.
+        """
+        src_dirs = [os.path.join(self.root, d) for d in self.dirs]
+        dst_dirs = [os.path.join(dst, d) for d in self.dirs]
+        for i in range(len(self)):
+            d = self.dir_idx[i]
+            name = self.names[i]
+            dst_item = os.path.join(dst_dirs[d], name)
+            if self.kind[i] == DIR:
+                os.makedirs(dst_item, exist_ok=True)
+                continue
+            copier(os.path.join(src_dirs[d], name), dst_item)
+            if chmod is not None:
+                chmod(dst_item, self.mode[i])
+
+    def diff(self, other):
+        """
+        Compare with a newer inventory.
+
+        Returns:
+            tuple: Sorted ``(added, removed, changed)`` relative paths, where
+            changed entries differ in kind, size, mode, mtime or link target.
+        """
+        mine = {p: i for i, p in enumerate(self.relpaths())}
+        added, changed = [], []
+        for j, p in enumerate(other.relpaths()):
+            i = mine.pop(p, None)
+            if i is None:
+                added.append(p)
+            elif (
+                self.kind[i] != other.kind[j]
+                or self.size[i] != other.size[j]
+                or self.mode[i] != other.mode[j]
+                or self.mtime[i] != other.mtime[j]
+                or self.link_target(i) != other.link_target(j)
+            ):
+                changed.append(p)
+        return sorted(added), sorted(mine), sorted(changed)
+
+    def verify(self, dst):
+        """
+        Check that ``dst`` contains every entry of the inventory.
+
+        Returns:
+            list: Relative paths that are missing or have the wrong kind or
+            size.
+        """
+        problems = []
+        dst_dirs = [os.path.join(dst, d) for d in self.dirs]
+        for i in range(len(self)):
+            try:
+                st = os.stat(os.path.join(dst_dirs[self.dir_idx[i]], self.names[i]))
+            except OSError:
+                problems.append(self.relpath(i))
+                continue
+            is_dir = stat.S_ISDIR(st.st_mode)
+            if is_dir != (self.kind[i] == DIR) or (
+                not is_dir and st.st_size != self.size[i]
+            ):
+                problems.append(self.relpath(i))
+        return problems
+
+
+def read_version(root):
+    """Return the contents of ``root/VERSION``, or None if there is none."""
+    try:
+        with open(os.path.join(root, "VERSION"), encoding="utf-8") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+def load_or_scan(path, root, subdirs=None):
+    """
+    Load the inventory saved at ``path`` if it still describes ``root``.
+
+    If the file is missing, unreadable, or was made for another SDK root,
+    version or set of subdirectories, the SDK is scanned again and the file
+    rewritten.
+    """
+    root = os.fspath(root)
+    if subdirs is not None:
+        subdirs = tuple(subdirs)
+    if os.path.exists(path):
+        try:
+            inv = SDKInventory.load(path)
+        except (ValueError, EOFError, OSError) as e:
+            logger.warning("Unable to load SDK inventory %r: %s", path, e)
+        else:
+            if (
+                inv.root == root
+                and inv.subdirs == subdirs
+                and inv.version == read_version(root)
+            ):
+                return inv
+            logger.warning("SDK inventory %r is outdated, rescanning %r", path, root)
+    inv = get_inventory(root, subdirs)
+    inv.save(path)
+    return inv
+
+
+@functools.lru_cache(maxsize=None)
+def get_inventory(root, subdirs=None):
+    """
+    Return the inventory of ``root``, scanning it once per process.
+
+    Call ``get_inventory.cache_clear()`` if the SDK changed since.
+    """
+    return SDKInventory.scan(root, subdirs)
@@ -0,0 +1,117 @@
+"""
+Opt-in per-phase profiling of environment creation.
+
+With ``cprofile`` every phase writes ``<phase>.prof`` (load it with
+:mod:`pstats` or snakeviz). With ``tracemalloc`` every phase writes
+``<phase>.tracemalloc.txt`` with the peak growth of traced memory and the
+top allocation sites. Nested phases are accounted to the innermost phase only:
+an outer phase's report leaves out what its inner phases allocated.
+"""
+
+import contextlib
+import cProfile
+import os
+import tracemalloc
+
+CPROFILE = "cprofile"
+TRACEMALLOC = "tracemalloc"
+PROFILERS = (CPROFILE, TRACEMALLOC)
+
+TOP_ALLOCATIONS = 25
+
+
+class PhaseProfiler:
+    """
+    Profile named phases into ``output_dir``.
+
+    Args:
+        kind: ``"cprofile"``, ``"tracemalloc"`` or None to disable profiling.
+        output_dir: Directory to write the reports to.
+    """
+
+    def __init__(self, kind=None, output_dir="menv-profile"):
+        if kind not in (None, *PROFILERS):
+            raise ValueError(f"Unknown profiler {kind!r}")
+        self.kind = kind
+        self.output_dir = os.fspath(output_dir)
+        self._stack = []
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        if self.kind is None:
+            yield
+            return
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = os.path.join(self.output_dir, name)
+        if self.kind == CPROFILE:
+            with self._cprofile(path):
+                yield
+        else:
+            with self._tracemalloc(name, path):
+                yield
+
+    @contextlib.contextmanager
+    def _cprofile(self, path):
+        # Only one profiler can be active at a time, pause the outer phase.
+        if self._stack:
+            self._stack[-1].disable()
+        profile = cProfile.Profile()
+        self._stack.append(profile)
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            self._stack.pop()
+            if self._stack:
+                self._stack[-1].enable()
+            profile.dump_stats(f"{path}.prof")
+
+    @contextlib.contextmanager
+    def _tracemalloc(self, name, path):
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+        if self._stack:
+            # Close the outer phase's segment, this one is accounted apart.
+            self._pause(self._stack[-1])
+        state = {"peak": 0, "diff": {}}
+        self._resume(state)
+        self._stack.append(state)
+        try:
+            yield
+        finally:
+            self._pause(state)
+            self._stack.pop()
+            diff = sorted(
+                state["diff"].items(), key=lambda item: abs(item[1][0]), reverse=True
+            )
+            with open(f"{path}.tracemalloc.txt", "w", encoding="utf-8") as f:
+                f.write(f"phase: {name}\n")
+                f.write(f"peak: {state['peak']} bytes\n\n")
+                f.write(f"top {TOP_ALLOCATIONS} allocations:\n")
+                for traceback, (size, count) in diff[:TOP_ALLOCATIONS]:
+                    f.write(f"{traceback}: size={size:+} B, count={count:+}\n")
+            if self._stack:
+                self._resume(self._stack[-1])
+            if started:
+                tracemalloc.stop()
+
+    @staticmethod
+    def _resume(state):
+        """Start a segment of the phase at the current traced memory."""
+        state["before"] = tracemalloc.take_snapshot()
+        state["start"] = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+
+    @staticmethod
+    def _pause(state):
+        """Add the segment started by :meth:`_resume` to the phase."""
+        growth = tracemalloc.get_traced_memory()[1] - state["start"]
+        state["peak"] = max(state["peak"], growth)
+        snapshot = tracemalloc.take_snapshot()
+        for stat in snapshot.compare_to(state["before"], "lineno"):
+            if stat.size_diff or stat.count_diff:
+                total = state["diff"].setdefault(stat.traceback, [0, 0])
+                total[0] += stat.size_diff
+                total[1] += stat.count_diff
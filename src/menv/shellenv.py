@@ -0,0 +1,79 @@
+"""
+Environment exports of a Mojo virtual environment.
+
+These are the same variables the ``mactivate`` scripts set, for tools like
+direnv that apply exports themselves instead of sourcing a script.
+"""
+
+import ast
+import json
+import os
+
+import tomlkit
+
+from .builder import MojoEnvBuilder
+
+FORMATS = ("sh", "fish", "json")
+
+
+def read_prompt(env_dir):
+    """Return the prompt stored in ``mojovenv.toml``, if any."""
+    path = os.path.join(env_dir, "mojovenv.toml")
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        prompt = tomlkit.load(f).get("mojo", {}).get("prompt")
+    if prompt is None:
+        return None
+    try:
+        # create_configuration stores the repr of the prompt.
+        return ast.literal_eval(str(prompt))
+    except (ValueError, SyntaxError):
+        return str(prompt)
+
+
+def env_exports(env_dir):
+    """
+    Compute the activation exports of an environment.
+
+    Args:
+        env_dir: The environment directory.
+
+    Returns:
+        tuple: ``(variables, path)`` where ``variables`` maps names to
+        literal values and ``path`` lists the directories to prepend to
+        ``PATH``.
+    """
+    env_dir = os.path.abspath(env_dir)
+    context = MojoEnvBuilder(prompt=read_prompt(env_dir)).make_context(env_dir)
+    variables = {
+        "VIRTUAL_ENV": context.env_dir,
+        "MODULAR_HOME": context.modular_home,
+        "VIRTUAL_ENV_PROMPT": context.prompt,
+    }
+    return variables, [context.bin_path, context.py_venv_binpath]
+
+
+def _sh_quote(value):
+    return "'" + value.replace("'", "'\"'\"'") + "'"
+
+
+def _fish_quote(value):
+    return "'" + value.replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+
+def shell_env(env_dir, fmt="sh"):
+    """Render the exports of ``env_dir`` as ``sh``, ``fish`` or ``json``."""
+    variables, path = env_exports(env_dir)
+    if fmt == "sh":
+        lines = [f"export {k}={_sh_quote(v)}" for k, v in variables.items()]
+        lines.append(f'export PATH={_sh_quote(os.pathsep.join(path))}":$PATH"')
+    elif fmt == "fish":
+        lines = [f"set -gx {k} {_fish_quote(v)}" for k, v in variables.items()]
+        lines.append(f"set -gx PATH {' '.join(map(_fish_quote, path))} $PATH")
+    elif fmt == "json":
+        variables["PATH"] = os.pathsep.join([*path, os.environ.get("PATH", "")])
+        return json.dumps(variables, indent=2) + "\n"
+    else:
+        raise ValueError(f"Unknown format {fmt!r}")
+    return "\n".join(lines) + "\n"
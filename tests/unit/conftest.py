@@ -0,0 +1,31 @@
+import pytest
+
+from menv import builder
+
+
+@pytest.fixture
+def sdk(tmp_path, monkeypatch):
+    """A small synthetic Mojo SDK installed in place of ``~/.modular``."""
+    modular_dir = tmp_path / "home" / builder.MODULAR_NAME
+    pkg_dir = modular_dir / builder.MODULAR_PKG_FOLDER / builder.MODULAR_PKG_NAME
+    for sub in ("bin", "lib/mojo/pkg_a", "lib/mojo/pkg_b"):
+        (pkg_dir / sub).mkdir(parents=True)
+    (pkg_dir / "VERSION").write_text("0.0.0\n")
+    for name in ("mojo", "mojo-lsp-server"):
+        (pkg_dir / "bin" / name).write_bytes(b"#!/bin/sh\n")
+        (pkg_dir / "bin" / name).chmod(0o755)
+    for i in range(10):
+        (pkg_dir / "lib" / f"lib{i}.so").write_bytes(b"\0" * i)
+        (pkg_dir / "lib/mojo/pkg_a" / f"mod{i}.mojopkg").write_bytes(b"a" * i)
+        (pkg_dir / "lib/mojo/pkg_b" / f"mod{i}.mojopkg").write_bytes(b"b" * i)
+    (pkg_dir / "lib" / "libcurrent.so").symlink_to("lib1.so")
+    (modular_dir / builder.MODULAR_CONFIG_NAME).write_text(
+        "[mojo]\nimport_path = /nowhere\n\n[installed]\npackages_modular_com_mojo = x\n"
+    )
+
+    monkeypatch.setattr(builder, "MODULAR_CONFIG", modular_dir / "modular.cfg")
+    monkeypatch.setattr(builder, "MOJO_PKG_DIR", pkg_dir)
+    monkeypatch.setattr(builder, "MOJO_BIN_DIR", pkg_dir / "bin")
+    monkeypatch.setattr(builder, "MOJO_LIB_DIR", pkg_dir / "lib")
+    monkeypatch.setattr(builder, "MOJO_EXECUTABLE", pkg_dir / "bin" / "mojo")
+    return pkg_dir
@@ -0,0 +1,239 @@
+import os
+import shutil
+import threading
+
+import pytest
+from click.testing import CliRunner
+
+from menv import dedupe as dedupe_module
+from menv.builder import MODULAR_CONFIG_NAME, MojoEnvBuilder
+from menv.cli import cli
+from menv.dedupe import PARTIAL_HASH_SIZE, dedupe
+from menv.inventory import SDKInventory, get_inventory
+
+
+def make_env(root, name, big):
+    env = root / name
+    pkg = env / ".modular" / "pkg" / "packages.modular.com_mojo"
+    (pkg / "bin").mkdir(parents=True)
+    (pkg / "lib").mkdir(parents=True)
+    (pkg / "bin" / "mojo").write_bytes(b"mojo binary")
+    (pkg / "bin" / "mojo").chmod(0o755)
+    (pkg / "lib" / "libmojo.so").write_bytes(big)
+    (pkg / "lib" / "libmojo.so").chmod(0o644)
+    (env / ".modular" / MODULAR_CONFIG_NAME).write_text("[mojo]\nx = 1\n")
+    return env
+
+
+class TestDedupe:
+    def test_dedupe(self, tmp_path) -> None:
+        big = os.urandom(PARTIAL_HASH_SIZE * 2)
+        envs = [make_env(tmp_path, name, big) for name in ("a", "b", "c")]
+        # Same size and prefix, different tail: must survive the full hash.
+        odd = envs[2] / ".modular" / "pkg" / "packages.modular.com_mojo" / "lib"
+        (odd / "libmojo.so").write_bytes(big[:-1] + bytes([big[-1] ^ 1]))
+
+        result = dedupe(envs)
+
+        lib = [
+            os.stat(e / ".modular/pkg/packages.modular.com_mojo/lib/libmojo.so")
+            for e in envs
+        ]
+        mojo = [
+            os.stat(e / ".modular/pkg/packages.modular.com_mojo/bin/mojo") for e in envs
+        ]
+        cfg = [os.stat(e / ".modular" / MODULAR_CONFIG_NAME) for e in envs]
+
+        assert lib[0].st_ino == lib[1].st_ino != lib[2].st_ino
+        assert len({st.st_ino for st in mojo}) == 1
+        assert all(st.st_mode & 0o777 == 0o755 for st in mojo)
+        assert len({st.st_ino for st in cfg}) == 3
+        assert result.files_linked == 3
+        assert result.bytes_reclaimed == len(big) + 2 * len(b"mojo binary")
+
+        # Running again finds nothing left to do.
+        assert dedupe(envs).files_linked == 0
+
+    def test_dry_run(self, tmp_path) -> None:
+        envs = [make_env(tmp_path, name, b"x" * 10) for name in ("a", "b")]
+
+        result = dedupe(envs, dry_run=True)
+
+        assert result.bytes_reclaimed == 10 + len(b"mojo binary")
+        assert (
+            envs[0] / ".modular/pkg/packages.modular.com_mojo/lib/libmojo.so"
+        ).stat().st_nlink == 1
+
+    def test_cli(self, tmp_path) -> None:
+        envs = [make_env(tmp_path, name, b"x" * 10) for name in ("a", "b")]
+
+        result = CliRunner().invoke(cli, ["dedupe", *map(str, envs)])
+
+        assert result.exit_code == 0, result.output
+        assert "Reclaimed 21 bytes" in result.output
+
+    def test_owner_is_part_of_the_key(self, tmp_path) -> None:
+        envs = [make_env(tmp_path, name, b"x" * 10) for name in ("a", "b")]
+        lib = [
+            e / ".modular/pkg/packages.modular.com_mojo/lib/libmojo.so" for e in envs
+        ]
+        try:
+            os.chown(lib[1], 4242, 4242)
+        except PermissionError:
+            pytest.skip("needs to chown files")
+
+        dedupe(envs)
+
+        assert lib[0].stat().st_ino != lib[1].stat().st_ino
+        assert lib[1].stat().st_uid == 4242
+
+    def test_file_vanishes_during_scan(self, tmp_path, monkeypatch) -> None:
+        envs = [make_env(tmp_path, name, b"x" * 10) for name in ("a", "b")]
+        gone = envs[0] / ".modular/pkg/packages.modular.com_mojo/bin/mojo"
+        scandir = os.scandir
+
+        class Vanishing:
+            def __init__(self, path):
+                with scandir(path) as it:
+                    self.entries = list(it)
+                if gone.exists():
+                    gone.unlink()
+
+            def __iter__(self):
+                return iter(self.entries)
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                pass
+
+        monkeypatch.setattr(dedupe_module.os, "scandir", Vanishing)
+
+        result = dedupe(envs)
+
+        # The rest of the tree is still scanned and linked.
+        assert result.files_linked == 1
+
+    def test_upgrade_after_dedupe(self, sdk, tmp_path) -> None:
+        envs = []
+        for name in ("a", "b"):
+            builder = MojoEnvBuilder(symlinks=False)
+            context = builder.ensure_directories(tmp_path / name)
+            builder.setup_mojo(context)
+            envs.append(context)
+        dedupe([c.env_dir for c in envs])
+        lib = [os.path.join(c.lib_path, "lib5.so") for c in envs]
+        assert os.stat(lib[0]).st_ino == os.stat(lib[1]).st_ino
+
+        (sdk / "lib" / "lib5.so").write_bytes(b"new")
+        get_inventory.cache_clear()
+        MojoEnvBuilder(symlinks=False, upgrade=True).setup_mojo(envs[0])
+
+        assert open(lib[0], "rb").read() == b"new"
+        assert open(lib[1], "rb").read() == b"\0" * 5
+        assert (
+            MojoEnvBuilder(
+                inventory=SDKInventory.load(envs[1].inventory_path)
+            ).verify_mojo(envs[1])
+            == []
+        )
+
+    def test_only_the_mojo_package_is_scanned(self, tmp_path) -> None:
+        envs = [make_env(tmp_path, name, b"x" * 10) for name in ("a", "b")]
+        # The stdlib venv rewrites its copied interpreter in place on upgrade.
+        python = [e / "venv" / "bin" / "python" for e in envs]
+        for p in python:
+            p.parent.mkdir(parents=True)
+            p.write_bytes(b"python")
+
+        result = dedupe([*envs, tmp_path / "not-an-env"])
+
+        assert result.files_linked == 2
+        assert python[0].stat().st_ino != python[1].stat().st_ino
+
+    def test_canonical_changed_after_hashing(self, tmp_path, monkeypatch) -> None:
+        envs = [make_env(tmp_path, name, b"x" * 10) for name in ("a", "b")]
+        link_group = dedupe_module._link_group
+
+        def rewrite_canonical(group, *args):
+            path = os.fsdecode(group[0][6])
+            with open(path, "r+b") as f:
+                f.write(b"y")
+            os.utime(path, ns=(0, 0))
+            link_group(group, *args)
+
+        monkeypatch.setattr(dedupe_module, "_link_group", rewrite_canonical)
+
+        result = dedupe(envs)
+
+        assert result.files_linked == 0
+        lib = [
+            e / ".modular/pkg/packages.modular.com_mojo/lib/libmojo.so" for e in envs
+        ]
+        assert lib[0].stat().st_ino != lib[1].stat().st_ino
+
+    def test_non_utf8_names(self, tmp_path) -> None:
+        envs = [make_env(tmp_path, name, b"x" * 10) for name in ("a", "b")]
+        names = [
+            os.fsencode(e / ".modular/pkg/packages.modular.com_mojo/lib") + b"/f\xff.so"
+            for e in envs
+        ]
+        for name in names:
+            with open(name, "wb") as f:
+                f.write(b"odd")
+
+        result = dedupe(envs)
+
+        assert result.files_linked == 3
+        assert os.stat(names[0]).st_ino == os.stat(names[1]).st_ino
+
+    def test_index_error_stops_the_scanners(self, tmp_path, monkeypatch) -> None:
+        envs = [make_env(tmp_path, name, b"x" * 10) for name in ("a", "b", "c")]
+        monkeypatch.setattr(dedupe_module, "BATCH_SIZE", 1)
+
+        def insert(self, rows):
+            raise RuntimeError("disk full")
+
+        monkeypatch.setattr(dedupe_module._Index, "insert", insert)
+        errors = []
+
+        def run():
+            try:
+                dedupe(envs, jobs=1)
+            except RuntimeError as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        thread.join(timeout=30)
+
+        assert not thread.is_alive()
+        assert len(errors) == 1
+
+    def test_dry_run_counts_links_within_the_group(self, tmp_path) -> None:
+        envs = [make_env(tmp_path, name, b"x" * 10) for name in ("a", "b")]
+        lib = envs[1] / ".modular/pkg/packages.modular.com_mojo/lib"
+        os.link(lib / "libmojo.so", lib / "libmojo.so.1")
+
+        dry = dedupe(envs, dry_run=True)
+        result = dedupe(envs)
+
+        assert dry.bytes_reclaimed == result.bytes_reclaimed == 10 + 11
+
+    def test_reflink_keeps_metadata(self, tmp_path, monkeypatch) -> None:
+        src, dst = tmp_path / "src", tmp_path / "dst"
+        src.write_bytes(b"data")
+        dst.write_bytes(b"data")
+        dst.chmod(0o640)
+        os.utime(dst, ns=(10**9, 2 * 10**9))
+        st = os.lstat(dst)
+        monkeypatch.setattr(dedupe_module, "_reflink", shutil.copyfile)
+
+        dedupe_module._replace_with_link(str(src), str(dst), st, dedupe_module.REFLINK)
+
+        new = os.lstat(dst)
+        assert new.st_ino != st.st_ino
+        assert (new.st_uid, new.st_gid) == (st.st_uid, st.st_gid)
+        assert new.st_mode == st.st_mode
+        assert new.st_mtime_ns == st.st_mtime_ns
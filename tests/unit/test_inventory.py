@@ -0,0 +1,114 @@
+import os
+
+from menv.builder import MojoEnvBuilder
+from menv.inventory import DIR, FILE, SDKInventory, get_inventory, load_or_scan
+
+
+class TestSDKInventory:
+    def test_scan(self, sdk) -> None:
+        inv = SDKInventory.scan(sdk, ("bin", "lib"))
+        paths = list(inv.relpaths())
+
+        assert "VERSION" not in paths
+        assert paths.index("lib") < paths.index(os.path.join("lib", "mojo"))
+        i = paths.index(os.path.join("lib", "libcurrent.so"))
+        assert inv.kind[i] == FILE
+        assert inv.size[i] == 1
+        assert inv.link_target(i) == "lib1.so"
+        j = paths.index(os.path.join("bin", "mojo"))
+        assert inv.mode[j] == 0o755
+        assert inv.link_target(j) is None
+        assert inv.kind[paths.index("bin")] == DIR
+
+    def test_save_load(self, sdk, tmp_path) -> None:
+        inv = SDKInventory.scan(sdk, ("bin", "lib"))
+        inv.save(tmp_path / "inv.bin")
+
+        loaded = SDKInventory.load(tmp_path / "inv.bin")
+
+        assert list(loaded.relpaths()) == list(inv.relpaths())
+        assert loaded.size == inv.size
+        assert loaded.link == inv.link
+        assert loaded.diff(inv) == ([], [], [])
+
+    def test_diff(self, sdk) -> None:
+        old = SDKInventory.scan(sdk, ("bin", "lib"))
+        (sdk / "lib" / "lib0.so").unlink()
+        (sdk / "lib" / "lib1.so").write_bytes(b"changed")
+        (sdk / "lib" / "new.so").write_bytes(b"")
+
+        added, removed, changed = old.diff(SDKInventory.scan(sdk, ("bin", "lib")))
+
+        assert added == [os.path.join("lib", "new.so")]
+        assert removed == [os.path.join("lib", "lib0.so")]
+        assert os.path.join("lib", "lib1.so") in changed
+
+    def test_setup_mojo(self, sdk, tmp_path) -> None:
+        builder = MojoEnvBuilder(symlinks=False)
+        context = builder.ensure_directories(tmp_path / "env")
+        builder.setup_mojo(context)
+
+        assert builder.verify_mojo(context) == []
+        assert os.path.exists(context.inventory_path)
+
+        # Upgrading removes what the SDK dropped.
+        (sdk / "lib" / "lib0.so").unlink()
+        get_inventory.cache_clear()
+        builder = MojoEnvBuilder(symlinks=False, upgrade=True)
+        builder.setup_mojo(context)
+
+        assert not os.path.exists(os.path.join(context.lib_path, "lib0.so"))
+        assert builder.verify_mojo(context) == []
+
+    def test_load_or_scan(self, sdk, tmp_path) -> None:
+        path = tmp_path / "inv.bin"
+        inv = load_or_scan(path, sdk, ("bin", "lib"))
+        assert inv.version == "0.0.0"
+        assert SDKInventory.load(path).version == "0.0.0"
+
+        # The SDK was updated: the saved inventory must not be reused.
+        (sdk / "VERSION").write_text("0.0.1\n")
+        (sdk / "lib" / "new.so").write_bytes(b"")
+        get_inventory.cache_clear()
+        inv = load_or_scan(path, sdk, ("bin", "lib"))
+
+        assert inv.version == "0.0.1"
+        assert os.path.join("lib", "new.so") in list(inv.relpaths())
+        assert SDKInventory.load(path).version == "0.0.1"
+
+        # Saved for another SDK root.
+        other = SDKInventory.scan(sdk / "lib")
+        other.version = "0.0.1"
+        other.save(path)
+        assert load_or_scan(path, sdk, ("bin", "lib")).root == str(sdk)
+
+        # Saved for other subdirectories of the same SDK.
+        load_or_scan(path, sdk)
+        inv = load_or_scan(path, sdk, ("bin", "lib"))
+        assert inv.subdirs == ("bin", "lib")
+        assert "VERSION" not in list(inv.relpaths())
+
+    def test_load_or_scan_corrupt(self, sdk, tmp_path) -> None:
+        path = tmp_path / "inv.bin"
+        load_or_scan(path, sdk, ("bin", "lib"))
+        data = path.read_bytes()
+
+        for corrupt in (data[:-3], data[:20], b""):
+            path.write_bytes(corrupt)
+            inv = load_or_scan(path, sdk, ("bin", "lib"))
+            assert len(inv) == len(SDKInventory.load(path))
+
+    def test_upgrade_with_corrupt_inventory(self, sdk, tmp_path) -> None:
+        builder = MojoEnvBuilder(symlinks=False)
+        context = builder.ensure_directories(tmp_path / "env")
+        builder.setup_mojo(context)
+        with open(context.inventory_path, "r+b") as f:
+            f.truncate(20)
+
+        builder = MojoEnvBuilder(symlinks=False, upgrade=True)
+        builder.setup_mojo(context)
+
+        assert builder.verify_mojo(context) == []
+        assert len(SDKInventory.load(context.inventory_path)) == len(
+            builder.get_sdk_inventory()
+        )
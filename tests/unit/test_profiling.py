@@ -0,0 +1,185 @@
+import collections
+import configparser
+import os
+import re
+import shutil
+import tracemalloc
+
+import pytest
+from click.testing import CliRunner
+
+from menv import cli as cli_module
+from menv.builder import MojoEnvBuilder
+from menv.inventory import SDKInventory, get_inventory
+from menv.profiling import PROFILERS, TRACEMALLOC, PhaseProfiler
+
+COUNTED = [
+    (os, "stat"),
+    (os, "lstat"),
+    (os, "chmod"),
+    (os, "listdir"),
+    (os, "scandir"),
+    (os, "symlink"),
+    (shutil, "copyfile"),
+    (shutil, "copymode"),
+    (configparser.ConfigParser, "read"),
+]
+
+
+@pytest.fixture
+def calls():
+    """Count calls of the wrapped ``os``/``shutil``/config functions."""
+    counter = collections.Counter()
+    monkeypatch = pytest.MonkeyPatch()
+
+    def wrap(name, func):
+        def wrapper(*args, **kwargs):
+            counter[name] += 1
+            return func(*args, **kwargs)
+
+        return wrapper
+
+    def start():
+        counter.clear()
+        for owner, name in COUNTED:
+            monkeypatch.setattr(owner, name, wrap(name, getattr(owner, name)))
+
+    counter.start = start
+    counter.stop = monkeypatch.undo
+    yield counter
+    monkeypatch.undo()
+
+
+def build(builder, env_dir, calls):
+    context = builder.ensure_directories(env_dir)
+    calls.start()
+    builder.setup_mojo(context)
+    calls.stop()
+    return context
+
+
+class TestHotPaths:
+    def test_setup_mojo_copies(self, sdk, tmp_path, calls) -> None:
+        inventory = get_inventory(str(sdk), ("bin", "lib"))
+        files = sum(1 for kind in inventory.kind if kind == 0)
+        bin_items = len(os.listdir(sdk / "bin"))
+
+        build(
+            MojoEnvBuilder(symlinks=False, inventory=inventory), tmp_path / "a", calls
+        )
+
+        assert calls["copymode"] == 0
+        assert calls["scandir"] == 0
+        assert calls["read"] == 1
+        assert calls["listdir"] == 1
+        # One copy per SDK file plus modular.cfg.
+        assert calls["copyfile"] == files + 1
+        assert calls["chmod"] == files + bin_items
+        assert calls["stat"] + calls["lstat"] <= 5 * files
+
+    def test_setup_mojo_symlinks(self, sdk, tmp_path, calls) -> None:
+        inventory = get_inventory(str(sdk), ("bin", "lib"))
+        files = sum(1 for kind in inventory.kind if kind == 0)
+
+        build(MojoEnvBuilder(symlinks=True, inventory=inventory), tmp_path / "a", calls)
+
+        assert calls["copymode"] == 0
+        assert calls["copyfile"] == 0
+        assert calls["chmod"] == 0
+        assert calls["symlink"] == files + 1
+        assert calls["read"] == 1
+
+    def test_sdk_scanned_once(self, sdk, tmp_path, calls, monkeypatch) -> None:
+        scans = []
+        scan = SDKInventory.scan.__func__
+        monkeypatch.setattr(
+            SDKInventory,
+            "scan",
+            classmethod(lambda cls, *a: scans.append(a) or scan(cls, *a)),
+        )
+        get_inventory.cache_clear()
+
+        for name in ("a", "b", "c"):
+            build(MojoEnvBuilder(symlinks=False), tmp_path / name, calls)
+
+        assert len(scans) == 1
+
+    def test_inventory_allocations(self, tmp_path) -> None:
+        n = 2000
+        lib = tmp_path / "lib"
+        for d in range(20):
+            (lib / f"d{d}").mkdir(parents=True)
+            for i in range(n // 20):
+                (lib / f"d{d}" / f"d{d}f{i}").touch()
+
+        tracemalloc.start()
+        try:
+            before = tracemalloc.take_snapshot()
+            inventory = SDKInventory.scan(tmp_path, ("lib",))
+            after = tracemalloc.take_snapshot()
+        finally:
+            tracemalloc.stop()
+        stats = after.compare_to(before, "filename")
+        blocks = sum(s.count_diff for s in stats)
+
+        assert len(inventory) == n + 21
+        # One interned name per entry; everything else lives in array columns.
+        assert blocks < 1.1 * n + 100
+
+
+class TestProfiling:
+    @pytest.mark.parametrize("kind", PROFILERS)
+    def test_profile(self, sdk, tmp_path, kind) -> None:
+        out = tmp_path / "profile"
+        builder = MojoEnvBuilder(profile=kind, profile_dir=out, symlinks=False)
+
+        builder.create(tmp_path / "env")
+
+        suffix = ".prof" if kind == "cprofile" else ".tracemalloc.txt"
+        for phase in (
+            "ensure_directories",
+            "setup_mojo",
+            "write_modular_cfg",
+            "install_scripts",
+        ):
+            assert (out / f"{phase}{suffix}").exists()
+        if kind == "tracemalloc":
+            assert not tracemalloc.is_tracing()
+            assert "peak: " in (out / f"setup_mojo{suffix}").read_text()
+
+    def test_cli_profile_dirs(self, sdk, tmp_path, monkeypatch) -> None:
+        monkeypatch.setattr(cli_module, "MOJO_PKG_DIR", sdk)
+        out = tmp_path / "profile"
+        dirs = [tmp_path / "a" / "env", tmp_path / "b" / "env"]
+
+        result = CliRunner().invoke(
+            cli_module.cli,
+            [*map(str, dirs), "--without-pip", "--copies"]
+            + ["--profile", "cprofile", "--profile-dir", str(out)],
+        )
+
+        assert result.exit_code == 0, result.output
+        assert sorted(os.listdir(out)) == ["0-env", "1-env"]
+        for sub in ("0-env", "1-env"):
+            assert (out / sub / "EnvBuilder.prof").exists()
+            assert (out / sub / "setup_mojo.prof").exists()
+
+    def test_tracemalloc_nested_phases(self, tmp_path) -> None:
+        profiler = PhaseProfiler(TRACEMALLOC, tmp_path)
+        size = 4 * 1024 * 1024
+
+        with profiler.phase("outer"):
+            small = bytearray(1024)
+            with profiler.phase("inner"):
+                big = bytearray(size)
+            del small
+
+        inner = (tmp_path / "inner.tracemalloc.txt").read_text()
+        outer = (tmp_path / "outer.tracemalloc.txt").read_text()
+        peak = lambda text: int(re.search(r"peak: (\d+)", text)[1])  # noqa: E731
+        top = lambda text: max(  # noqa: E731
+            int(s) for s in re.findall(r"size=([+-]\d+) B", text)
+        )
+        assert peak(inner) > 0.99 * size and top(inner) >= size
+        assert peak(outer) < 0.01 * size and top(outer) < 0.01 * size
+        del big
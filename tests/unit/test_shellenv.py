@@ -0,0 +1,132 @@
+import json
+import os
+import shutil
+import subprocess
+
+import pytest
+from click.testing import CliRunner
+
+from menv.builder import MojoEnvBuilder
+from menv.cli import cli
+from menv.shellenv import shell_env
+
+
+@pytest.fixture
+def context(tmp_path):
+    builder = MojoEnvBuilder(prompt="demo")
+    context = builder.ensure_directories(tmp_path / "env")
+    builder.setup_scripts(context)
+    return context
+
+
+class TestShellEnv:
+    def test_mactivate_is_precomputed(self, context) -> None:
+        for name in ("mactivate", "mactivate.fish", "mactivate.csh"):
+            with open(os.path.join(context.py_venv_binpath, name)) as f:
+                text = f.read()
+            assert "__VENV_" not in text
+            assert "$(" not in text
+            assert context.modular_home in text
+
+    @pytest.mark.skipif(shutil.which("bash") is None, reason="needs bash")
+    def test_mactivate(self, context) -> None:
+        mactivate = os.path.join(context.py_venv_binpath, "mactivate")
+        script = (
+            f'source "{mactivate}"; '
+            'echo "$VIRTUAL_ENV|$MODULAR_HOME|$PATH"; '
+            'deactivate; echo "${MODULAR_HOME:-unset}|$PATH"'
+        )
+        env = {"PATH": "/usr/bin:/bin", "MODULAR_HOME": "/global"}
+        out = subprocess.run(
+            ["bash", "--noprofile", "--norc", "-c", script],
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.splitlines()
+
+        venv, modular_home, path = out[0].split("|")
+        assert venv == context.env_dir
+        assert modular_home == context.modular_home
+        assert path.split(":")[:2] == [context.bin_path, context.py_venv_binpath]
+        assert out[1] == "/global|/usr/bin:/bin"
+
+    @pytest.mark.skipif(shutil.which("bash") is None, reason="needs bash")
+    @pytest.mark.parametrize("global_home", ["/global", None])
+    def test_mactivate_over_python_venv(self, context, global_home) -> None:
+        # The README flow: a Python venv is active before sourcing mactivate.
+        activate = os.path.join(context.py_venv_binpath, "activate")
+        mactivate = os.path.join(context.py_venv_binpath, "mactivate")
+        script = (
+            f'source "{activate}"; source "{mactivate}"; '
+            'echo "$MODULAR_HOME"; deactivate; echo "${MODULAR_HOME-unset}"'
+        )
+        env = {"PATH": "/usr/bin:/bin"}
+        if global_home is not None:
+            env["MODULAR_HOME"] = global_home
+        out = subprocess.run(
+            ["bash", "--noprofile", "--norc", "-c", script],
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.splitlines()
+
+        assert out == [context.modular_home, global_home or "unset"]
+
+    @pytest.mark.parametrize(
+        "shell, name, script",
+        [
+            (
+                "fish",
+                "mactivate.fish",
+                'source {}; echo $MODULAR_HOME; deactivate; echo "$MODULAR_HOME"',
+            ),
+            (
+                "tcsh",
+                "mactivate.csh",
+                'source {}; echo $MODULAR_HOME; deactivate; echo "$MODULAR_HOME"',
+            ),
+        ],
+    )
+    def test_mactivate_other_shells(self, context, shell, name, script) -> None:
+        if shutil.which(shell) is None:
+            pytest.skip(f"needs {shell}")
+        path = os.path.join(context.py_venv_binpath, name)
+        env = {"PATH": "/usr/bin:/bin", "MODULAR_HOME": "/global", "HOME": "/tmp"}
+        out = subprocess.run(
+            [shell, "-c", script.format(path)],
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.splitlines()
+
+        assert out == [context.modular_home, "/global"]
+
+    def test_shell_env(self, context) -> None:
+        sh = shell_env(context.env_dir, "sh")
+        assert f"export MODULAR_HOME='{context.modular_home}'" in sh
+        assert f"export PATH='{context.bin_path}:{context.py_venv_binpath}'" in sh
+
+        fish = shell_env(context.env_dir, "fish")
+        assert f"set -gx VIRTUAL_ENV '{context.env_dir}'" in fish
+
+        data = json.loads(shell_env(context.env_dir, "json"))
+        assert data["VIRTUAL_ENV"] == context.env_dir
+        assert data["PATH"].startswith(context.bin_path)
+
+    def test_cli(self, context) -> None:
+        result = CliRunner().invoke(
+            cli, ["shell-env", context.env_dir, "--format", "json"]
+        )
+
+        assert result.exit_code == 0, result.output
+        assert json.loads(result.output)["MODULAR_HOME"] == context.modular_home
+
+    def test_prompt(self, sdk, context) -> None:
+        MojoEnvBuilder(prompt="demo").create_configuration(context)
+
+        data = json.loads(shell_env(context.env_dir, "json"))
+
+        assert data["VIRTUAL_ENV_PROMPT"] == "(demo) "